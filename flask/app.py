@@ -30,6 +30,7 @@ except ImportError:
     PANDAS_AVAILABLE = False
 import random
 from sklearn.ensemble import RandomForestClassifier
+from model_manager import ModelManager
 
 app = Flask(__name__)
 CORS(app)
@@ -46,12 +47,37 @@ SUPPLY_CHAIN_MODEL_PATH = 'models/supply_chain_model.pkl'
 FERTILIZATION_MODEL_PATH = 'models/fertilization_model.h5'
 SOIL_SCALER_PATH = 'models/scaler.pkl'  # Path for the scaler
 
-# Load models (will be loaded once server starts)
-leaf_disease_model = None
-irrigation_model = None 
-supply_chain_model = None
-fertilization_model = None
-soil_scaler = None
+def read_env_float(name, default):
+    """Read a numeric setting from the environment, falling back on bad values"""
+    value = os.environ.get(name, '').strip()
+    if not value:
+        return default
+    try:
+        number = float(value)
+    except ValueError:
+        print(f"Warning: invalid value {value!r} for {name}, using {default}")
+        return default
+    if number < 0:
+        print(f"Warning: negative value {value!r} for {name}, using {default}")
+        return default
+    return number
+
+def model_file_size(path):
+    """On-disk size of a model file, used as its expected size before loading"""
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+# Model residency settings
+# The budget caps the estimated size of resident models (Keras weight bytes, file
+# size for pickled models), not total process memory; /health reports both
+MODEL_MEMORY_BUDGET_MB = read_env_float('MODEL_MEMORY_BUDGET_MB', 0)  # 0 means no budget
+MODEL_IDLE_TIMEOUT = read_env_float('MODEL_IDLE_TIMEOUT', 0)  # Seconds, 0 disables idle eviction
+PINNED_MODELS = [name.strip() for name in os.environ.get('PINNED_MODELS', '').split(',') if name.strip()]
+
+# Models are loaded on demand and evicted when over budget or idle
+model_manager = ModelManager(
+    budget_bytes=int(MODEL_MEMORY_BUDGET_MB * 1024 * 1024),
+    idle_timeout=MODEL_IDLE_TIMEOUT
+)
 
 # Create simple standalone models for soil analysis if TensorFlow is not available
 standalone_irrigation_model = None
@@ -129,102 +155,135 @@ def create_standalone_models():
         print(f"Error creating standalone models: {e}")
         return False
 
-def load_models():
-    """Load all ML models if available"""
-    global leaf_disease_model, irrigation_model, supply_chain_model, fertilization_model, soil_scaler
-    
-    if TENSORFLOW_AVAILABLE:
-        try:
-            print(f"Attempting to load leaf disease model from: {LEAF_DISEASE_MODEL_PATH}")
-            print(f"Current working directory: {os.getcwd()}")
-            print(f"Directory contents: {os.listdir('models')}")
-            print(f"TensorFlow version: {tf.__version__}")
-            
-            if os.path.exists(LEAF_DISEASE_MODEL_PATH):
+def load_leaf_disease_model():
+    """Load the leaf disease model, falling back to a mock model"""
+    leaf_disease_model = None
+    try:
+        print(f"Attempting to load leaf disease model from: {LEAF_DISEASE_MODEL_PATH}")
+        print(f"Current working directory: {os.getcwd()}")
+        print(f"Directory contents: {os.listdir('models')}")
+        print(f"TensorFlow version: {tf.__version__}")
+        
+        if os.path.exists(LEAF_DISEASE_MODEL_PATH):
+            try:
+                # First attempt: Load with default settings
+                leaf_disease_model = load_model(LEAF_DISEASE_MODEL_PATH, compile=False)
+                print("Leaf disease model loaded successfully")
+            except Exception as e:
+                print(f"Error during first model loading attempt: {str(e)}")
+                print("Attempting to load with custom_objects...")
                 try:
-                    # First attempt: Load with default settings
-                    leaf_disease_model = load_model(LEAF_DISEASE_MODEL_PATH, compile=False)
-                    print("Leaf disease model loaded successfully")
-                except Exception as e:
-                    print(f"Error during first model loading attempt: {str(e)}")
-                    print("Attempting to load with custom_objects...")
+                    # Second attempt: Load with custom objects and safe_mode
+                    leaf_disease_model = load_model(
+                        LEAF_DISEASE_MODEL_PATH,
+                        custom_objects={
+                            'custom_activation': tf.nn.relu,
+                            'relu': tf.nn.relu,
+                            'ReLU': tf.keras.layers.ReLU
+                        },
+                        compile=False,
+                        safe_mode=True
+                    )
+                    print("Leaf disease model loaded successfully with custom_objects")
+                except Exception as e2:
+                    print(f"Error during second model loading attempt: {str(e2)}")
+                    print("Attempting to load with legacy format...")
                     try:
-                        # Second attempt: Load with custom objects and safe_mode
-                        leaf_disease_model = load_model(
+                        # Third attempt: Load with legacy format
+                        leaf_disease_model = tf.keras.models.load_model(
                             LEAF_DISEASE_MODEL_PATH,
+                            compile=False,
                             custom_objects={
                                 'custom_activation': tf.nn.relu,
                                 'relu': tf.nn.relu,
                                 'ReLU': tf.keras.layers.ReLU
-                            },
-                            compile=False,
-                            safe_mode=True
+                            }
                         )
-                        print("Leaf disease model loaded successfully with custom_objects")
-                    except Exception as e2:
-                        print(f"Error during second model loading attempt: {str(e2)}")
-                        print("Attempting to load with legacy format...")
-                        try:
-                            # Third attempt: Load with legacy format
-                            leaf_disease_model = tf.keras.models.load_model(
-                                LEAF_DISEASE_MODEL_PATH,
-                                compile=False,
-                                custom_objects={
-                                    'custom_activation': tf.nn.relu,
-                                    'relu': tf.nn.relu,
-                                    'ReLU': tf.keras.layers.ReLU
-                                }
-                            )
-                            print("Leaf disease model loaded successfully with legacy format")
-                        except Exception as e3:
-                            print(f"Error during third model loading attempt: {str(e3)}")
-                            print("Model loading failed after all attempts")
-                            print(f"Model file size: {os.path.getsize(LEAF_DISEASE_MODEL_PATH)} bytes")
-                            print(f"Model file path: {os.path.abspath(LEAF_DISEASE_MODEL_PATH)}")
-                            # Create a simple mock model for fallback
-                            leaf_disease_model = create_mock_model()
-                            print("Created mock model for fallback")
-            else:
-                print(f"Error: Model file not found at {LEAF_DISEASE_MODEL_PATH}")
-                # Create a simple mock model for fallback
-                leaf_disease_model = create_mock_model()
-                print("Created mock model for fallback")
-        except Exception as e:
-            print(f"Error loading leaf disease model: {str(e)}")
-            print(f"TensorFlow version: {tf.__version__}")
-            print(f"Model file size: {os.path.getsize(LEAF_DISEASE_MODEL_PATH) if os.path.exists(LEAF_DISEASE_MODEL_PATH) else 'File not found'}")
+                        print("Leaf disease model loaded successfully with legacy format")
+                    except Exception as e3:
+                        print(f"Error during third model loading attempt: {str(e3)}")
+                        print("Model loading failed after all attempts")
+                        print(f"Model file size: {os.path.getsize(LEAF_DISEASE_MODEL_PATH)} bytes")
+                        print(f"Model file path: {os.path.abspath(LEAF_DISEASE_MODEL_PATH)}")
+                        # Create a simple mock model for fallback
+                        leaf_disease_model = create_mock_model()
+                        print("Created mock model for fallback")
+        else:
+            print(f"Error: Model file not found at {LEAF_DISEASE_MODEL_PATH}")
             # Create a simple mock model for fallback
             leaf_disease_model = create_mock_model()
             print("Created mock model for fallback")
-        
-        try:
-            if os.path.exists(IRRIGATION_MODEL_PATH):
-                irrigation_model = load_model(IRRIGATION_MODEL_PATH)
-                print("Irrigation model loaded successfully")
-        except Exception as e:
-            print(f"Error loading irrigation model: {e}")
-            
-        try:
-            if os.path.exists(FERTILIZATION_MODEL_PATH):
-                fertilization_model = load_model(FERTILIZATION_MODEL_PATH)
-                print("Fertilization model loaded successfully")
-        except Exception as e:
-            print(f"Error loading fertilization model: {e}")
-    
-    try:
-        if os.path.exists(SUPPLY_CHAIN_MODEL_PATH):
-            with open(SUPPLY_CHAIN_MODEL_PATH, 'rb') as f:
-                supply_chain_model = pickle.load(f)
-            print("Supply chain model loaded successfully")
     except Exception as e:
-        print(f"Error loading supply chain model: {e}")
-        
-    try:
-        if os.path.exists(SOIL_SCALER_PATH) and JOBLIB_AVAILABLE:
-            soil_scaler = joblib.load(SOIL_SCALER_PATH)
-            print("Soil scaler loaded successfully")
-    except Exception as e:
-        print(f"Error loading soil scaler: {e}")
+        print(f"Error loading leaf disease model: {str(e)}")
+        print(f"TensorFlow version: {tf.__version__}")
+        print(f"Model file size: {os.path.getsize(LEAF_DISEASE_MODEL_PATH) if os.path.exists(LEAF_DISEASE_MODEL_PATH) else 'File not found'}")
+        # Create a simple mock model for fallback
+        leaf_disease_model = create_mock_model()
+        print("Created mock model for fallback")
+    return leaf_disease_model
+
+def load_irrigation_model():
+    """Load the irrigation model if available"""
+    if os.path.exists(IRRIGATION_MODEL_PATH):
+        irrigation_model = load_model(IRRIGATION_MODEL_PATH)
+        print("Irrigation model loaded successfully")
+        return irrigation_model
+    return None
+
+def load_fertilization_model():
+    """Load the fertilization model if available"""
+    if os.path.exists(FERTILIZATION_MODEL_PATH):
+        fertilization_model = load_model(FERTILIZATION_MODEL_PATH)
+        print("Fertilization model loaded successfully")
+        return fertilization_model
+    return None
+
+def load_supply_chain_model():
+    """Load the supply chain model if available"""
+    if os.path.exists(SUPPLY_CHAIN_MODEL_PATH):
+        with open(SUPPLY_CHAIN_MODEL_PATH, 'rb') as f:
+            supply_chain_model = pickle.load(f)
+        print("Supply chain model loaded successfully")
+        return supply_chain_model
+    return None
+
+def load_soil_scaler():
+    """Load the soil scaler if available"""
+    if os.path.exists(SOIL_SCALER_PATH) and JOBLIB_AVAILABLE:
+        soil_scaler = joblib.load(SOIL_SCALER_PATH)
+        print("Soil scaler loaded successfully")
+        return soil_scaler
+    return None
+
+def load_models():
+    """Register all ML models with the model manager and preload them"""
+    if TENSORFLOW_AVAILABLE:
+        # The leaf disease loader falls back to a mock model, so it is always loadable
+        model_manager.register('leaf_disease', load_leaf_disease_model,
+                               size_bytes=model_file_size(LEAF_DISEASE_MODEL_PATH))
+        model_manager.register('irrigation', load_irrigation_model,
+                               size_bytes=model_file_size(IRRIGATION_MODEL_PATH),
+                               check=lambda: os.path.exists(IRRIGATION_MODEL_PATH))
+        model_manager.register('fertilization', load_fertilization_model,
+                               size_bytes=model_file_size(FERTILIZATION_MODEL_PATH),
+                               check=lambda: os.path.exists(FERTILIZATION_MODEL_PATH))
+    model_manager.register('supply_chain', load_supply_chain_model,
+                           size_bytes=model_file_size(SUPPLY_CHAIN_MODEL_PATH),
+                           check=lambda: os.path.exists(SUPPLY_CHAIN_MODEL_PATH))
+    model_manager.register('soil_scaler', load_soil_scaler,
+                           size_bytes=model_file_size(SOIL_SCALER_PATH),
+                           check=lambda: JOBLIB_AVAILABLE and os.path.exists(SOIL_SCALER_PATH))
+    
+    for name in PINNED_MODELS:
+        if not model_manager.pin(name):
+            print(f"Warning: PINNED_MODELS entry '{name}' does not match a registered model")
+    
+    # With a budget only pinned models are preloaded, the rest load on first use
+    if model_manager.budget_bytes:
+        model_manager.preload(PINNED_MODELS)
+    else:
+        model_manager.preload()
+    model_manager.start_idle_sweeper()
         
     # Create standalone models if TensorFlow is not available
     if not TENSORFLOW_AVAILABLE:
@@ -256,12 +315,13 @@ def health_check():
     return jsonify({
         'status': 'OK',
         'models': {
-            'leaf_disease': leaf_disease_model is not None,
-            'irrigation': irrigation_model is not None,
-            'supply_chain': supply_chain_model is not None,
-            'fertilization': fertilization_model is not None,
-            'soil_scaler': soil_scaler is not None
+            'leaf_disease': model_manager.is_available('leaf_disease'),
+            'irrigation': model_manager.is_available('irrigation'),
+            'supply_chain': model_manager.is_available('supply_chain'),
+            'fertilization': model_manager.is_available('fertilization'),
+            'soil_scaler': model_manager.is_available('soil_scaler')
         },
+        'model_residency': model_manager.stats(),
         'libraries': {
             'tensorflow': TENSORFLOW_AVAILABLE,
             'opencv': 'cv2' in globals(),
@@ -278,6 +338,7 @@ def predict_leaf_disease():
     if not TENSORFLOW_AVAILABLE:
         return jsonify({'error': 'TensorFlow is not available'}), 503
     
+    leaf_disease_model = model_manager.get('leaf_disease')
     if leaf_disease_model is None:
         print("Leaf disease model is not loaded. Current state:")
         print(f"TensorFlow available: {TENSORFLOW_AVAILABLE}")
@@ -332,6 +393,7 @@ def predict_leaf_disease():
 @app.route('/predict/irrigation', methods=['POST'])
 def predict_irrigation():
     """Predict optimal irrigation schedule"""
+    irrigation_model = model_manager.get('irrigation')
     if irrigation_model is None and TENSORFLOW_AVAILABLE:
         return jsonify({'error': 'Model not loaded'}), 503
     
@@ -385,6 +447,7 @@ def predict_irrigation():
 @app.route('/predict/supply-chain', methods=['POST'])
 def predict_supply_chain():
     """Predict supply chain metrics"""
+    supply_chain_model = model_manager.get('supply_chain')
     if supply_chain_model is None:
         # Return mock prediction
         location = request.json.get('location', 'Unknown')
@@ -449,6 +512,9 @@ def predict_soil_needs():
             data.get("Temperature °C", 0),
             data.get("Rainfall mm", 0),
         ]).reshape(1, -1)
+        soil_scaler = model_manager.get('soil_scaler')
+        irrigation_model = model_manager.get('irrigation')
+        fertilization_model = model_manager.get('fertilization')
         features_scaled = soil_scaler.transform(features)  # Scale input data
 
         irrigation_pred = irrigation_model.predict(features_scaled)
@@ -0,0 +1,319 @@
+"""Memory-budgeted residency for the ML models served by app.py"""
+import gc
+import math
+import os
+import sys
+import threading
+import time
+
+
+def variable_nbytes(variable):
+    """Size of a Keras/TensorFlow variable from its shape and dtype, without copying it"""
+    dtype = variable.dtype
+    itemsize = getattr(dtype, 'size', None)  # tf.DType
+    if itemsize is None:
+        import numpy as np
+        itemsize = np.dtype(getattr(dtype, 'as_numpy_dtype', dtype)).itemsize
+    return math.prod(int(dim) for dim in variable.shape) * itemsize
+
+
+def estimate_model_size(model):
+    """Estimate the weight bytes of a loaded Keras model, or None for other models
+
+    This counts weight and optimizer variables only. TensorFlow graph, allocator
+    and backend overhead is not included and is not always returned to the OS
+    on eviction, so treat the figure as approximate.
+    """
+    if not (hasattr(model, 'weights') and hasattr(model, 'get_weights')):
+        return None
+    variables = list(model.weights)
+    optimizer = getattr(model, 'optimizer', None)
+    if optimizer is not None:
+        optimizer_variables = getattr(optimizer, 'variables', [])
+        if callable(optimizer_variables):
+            optimizer_variables = optimizer_variables()
+        variables.extend(optimizer_variables)
+    return int(sum(variable_nbytes(v) for v in variables))
+
+
+def process_rss_bytes():
+    """Current resident memory of this process, or None if it cannot be read"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class ModelManager:
+    """Keep models resident within a memory budget, evicting the least recently used ones
+
+    Each model's size is remembered across evictions (or declared at register),
+    so room is made before a known model is reloaded. A model's first load can
+    only be measured afterwards, so the budget is re-checked once it is in memory.
+
+    The budget applies to these size estimates, not to process memory: Keras
+    backend state is not always freed on eviction. stats() reports the process
+    resident memory alongside the estimate.
+
+    A failed load is cached for `retry_after` seconds so broken models are not
+    reloaded on every request.
+    """
+
+    def __init__(self, budget_bytes=0, idle_timeout=0, retry_after=60):
+        self.budget_bytes = budget_bytes
+        self.idle_timeout = idle_timeout
+        self.retry_after = retry_after
+        self.load_count = 0
+        self.evict_count = 0
+        self._models = {}
+        self._loading_bytes = 0
+        self._use_counter = 0
+        self._lock = threading.Lock()
+
+    def register(self, name, loader, pinned=False, size_bytes=0, check=None):
+        """Register a model by name with the function that loads it
+
+        `size_bytes` declares the expected size (e.g. the model file size) so the
+        budget can be applied before the first load. Non-Keras models keep this
+        size once loaded. `check` is an optional cheap callable reporting whether
+        the model can be loaded, used by is_available() before the first load attempt.
+        """
+        with self._lock:
+            self._models[name] = {
+                'loader': loader,
+                'check': check,
+                'model': None,
+                'size': size_bytes,
+                'pinned': pinned,
+                'available': None,
+                'failed_at': None,
+                'last_used': None,
+                'use_order': 0,
+                'loads': 0,
+                'evictions': 0,
+                'load_lock': threading.Lock()
+            }
+
+    def pin(self, name):
+        """Protect a model from eviction. Returns False if the model is unknown"""
+        with self._lock:
+            if name not in self._models:
+                return False
+            self._models[name]['pinned'] = True
+            return True
+
+    def unpin(self, name):
+        """Allow a model to be evicted again"""
+        with self._lock:
+            if name not in self._models:
+                return False
+            self._models[name]['pinned'] = False
+            dropped = self._make_room(0)
+        self._release(dropped)
+        return True
+
+    def get(self, name):
+        """Return a model, loading it on demand. Returns None if it cannot be loaded"""
+        with self._lock:
+            entry = self._models.get(name)
+            if entry is None:
+                return None
+            if entry['model'] is not None:
+                self._touch(entry)
+                return entry['model']
+            if self._failed_recently(entry):
+                return None
+
+        # Only requests for this model wait on its load; other models stay available
+        with entry['load_lock']:
+            with self._lock:
+                if entry['model'] is not None:
+                    self._touch(entry)
+                    return entry['model']
+                if self._failed_recently(entry):
+                    return None
+                reserved = entry['size']
+                dropped = self._make_room(reserved)
+                self._loading_bytes += reserved
+            self._release(dropped)
+
+            start = time.monotonic()
+            try:
+                model = entry['loader']()
+            except Exception as e:
+                print(f"Error loading model '{name}': {e}")
+                model = None
+            size = estimate_model_size(model) if model is not None else None
+
+            with self._lock:
+                self._loading_bytes -= reserved
+                entry['available'] = model is not None
+                if model is None:
+                    entry['failed_at'] = time.monotonic()
+                    return None
+                entry['failed_at'] = None
+                if size is None:
+                    size = entry['size'] or sys.getsizeof(model)
+                entry['model'] = model
+                entry['size'] = size
+                entry['loads'] += 1
+                self.load_count += 1
+                self._touch(entry)
+                dropped = self._make_room(0, keep=name)
+            print(f"Loaded model '{name}' ({size / (1024 * 1024):.1f} MB) in {time.monotonic() - start:.2f}s")
+            self._release(dropped)
+            return model
+
+    def is_resident(self, name):
+        """Check whether a model is currently held in memory"""
+        with self._lock:
+            entry = self._models.get(name)
+            return entry is not None and entry['model'] is not None
+
+    def is_available(self, name):
+        """Check whether a model is registered and can be loaded"""
+        with self._lock:
+            entry = self._models.get(name)
+            if entry is None:
+                return False
+            if entry['model'] is not None:
+                return True
+            if entry['available'] is not None:
+                return entry['available']
+            check = entry['check']
+        return bool(check()) if check else True
+
+    def used_bytes(self):
+        """Total estimated footprint of resident models"""
+        with self._lock:
+            return self._used_bytes()
+
+    def preload(self, names=None):
+        """Load models up front (all registered models by default)"""
+        with self._lock:
+            names = list(names if names is not None else self._models)
+        for name in names:
+            self.get(name)
+
+    def evict(self, name):
+        """Drop a model from memory; it will be reloaded on next use
+
+        Evicting a model whose load failed clears the failure so the next
+        get() retries immediately.
+        """
+        with self._lock:
+            entry = self._models.get(name)
+            if entry is None:
+                return False
+            if entry['model'] is None:
+                if entry['failed_at'] is not None:
+                    entry['available'] = None
+                    entry['failed_at'] = None
+                return False
+            dropped = [self._drop(name, entry)]
+        self._release(dropped)
+        return True
+
+    def evict_idle(self):
+        """Evict unpinned models that have not been used within the idle timeout"""
+        if not self.idle_timeout:
+            return 0
+        with self._lock:
+            now = time.monotonic()
+            dropped = [
+                self._drop(name, entry) for name, entry in self._models.items()
+                if entry['model'] is not None and not entry['pinned']
+                and now - entry['last_used'] > self.idle_timeout
+            ]
+        count = len(dropped)
+        self._release(dropped)
+        return count
+
+    def start_idle_sweeper(self, interval=None):
+        """Periodically evict idle models in a background thread"""
+        if not self.idle_timeout:
+            return None
+        interval = interval or max(1.0, self.idle_timeout / 2)
+
+        def sweep():
+            while True:
+                time.sleep(interval)
+                self.evict_idle()
+
+        thread = threading.Thread(target=sweep, name='model-idle-sweeper', daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self):
+        """Report residency, estimated footprint and load/evict counts"""
+        with self._lock:
+            now = time.monotonic()
+            return {
+                'budget_bytes': self.budget_bytes,
+                'used_bytes': self._used_bytes(),
+                'process_rss_bytes': process_rss_bytes(),
+                'idle_timeout': self.idle_timeout,
+                'loads': self.load_count,
+                'evictions': self.evict_count,
+                'models': {
+                    name: {
+                        'resident': entry['model'] is not None,
+                        'pinned': entry['pinned'],
+                        'size_bytes': entry['size'],
+                        'idle_seconds': round(now - entry['last_used'], 1) if entry['last_used'] is not None else None,
+                        'loads': entry['loads'],
+                        'evictions': entry['evictions']
+                    }
+                    for name, entry in self._models.items()
+                }
+            }
+
+    # The helpers below expect self._lock to be held
+
+    def _used_bytes(self):
+        return sum(entry['size'] for entry in self._models.values() if entry['model'] is not None)
+
+    def _failed_recently(self, entry):
+        return (entry['failed_at'] is not None
+                and time.monotonic() - entry['failed_at'] < self.retry_after)
+
+    def _touch(self, entry):
+        self._use_counter += 1
+        entry['use_order'] = self._use_counter
+        entry['last_used'] = time.monotonic()
+
+    def _drop(self, name, entry):
+        model = entry['model']
+        entry['model'] = None
+        entry['evictions'] += 1
+        self.evict_count += 1
+        return name, model
+
+    def _make_room(self, needed, keep=None):
+        """Evict least recently used unpinned models until `needed` more bytes fit"""
+        dropped = []
+        if not self.budget_bytes:
+            return dropped
+        while self._used_bytes() + self._loading_bytes + needed > self.budget_bytes:
+            candidates = [
+                (entry['use_order'], name) for name, entry in self._models.items()
+                if entry['model'] is not None and not entry['pinned'] and name != keep
+            ]
+            if not candidates:
+                print(f"Warning: models need {self._used_bytes() + self._loading_bytes + needed} bytes, "
+                      f"over the {self.budget_bytes} byte budget")
+                break
+            name = min(candidates)[1]
+            dropped.append(self._drop(name, self._models[name]))
+        return dropped
+
+    def _release(self, dropped):
+        """Free evicted models outside the lock"""
+        if not dropped:
+            return
+        names = [name for name, _ in dropped]
+        dropped.clear()
+        gc.collect()
+        for name in names:
+            print(f"Evicted model '{name}'")
@@ -0,0 +1,254 @@
+import threading
+import time
+
+from model_manager import ModelManager, estimate_model_size
+
+
+class StubDType:
+    def __init__(self, size):
+        self.size = size
+
+
+class StubVariable:
+    def __init__(self, nbytes):
+        self.shape = (nbytes // 4,)
+        self.dtype = StubDType(4)
+
+    def numpy(self):
+        raise AssertionError('size estimation must not copy variables')
+
+
+class StubModel:
+    """Exposes the Keras variable interface used for size estimation"""
+
+    def __init__(self, nbytes):
+        self.weights = [StubVariable(nbytes)]
+
+    def get_weights(self):
+        raise AssertionError('size estimation must not copy weights')
+
+
+def stub_loader(nbytes, calls=None):
+    def load():
+        if calls is not None:
+            calls.append(time.monotonic())
+        return StubModel(nbytes)
+    return load
+
+
+def resident(manager):
+    return {name for name, info in manager.stats()['models'].items() if info['resident']}
+
+
+def test_estimate_model_size_counts_weights():
+    assert estimate_model_size(StubModel(256)) == 256
+
+
+def test_non_keras_model_keeps_declared_size():
+    manager = ModelManager()
+    manager.register('scaler', lambda: {'mean': [0.0] * 10}, size_bytes=4096)
+    manager.get('scaler')
+    assert estimate_model_size({'mean': []}) is None
+    assert manager.used_bytes() == 4096
+
+
+def test_stats_report_process_memory():
+    stats = ModelManager().stats()
+    assert 'process_rss_bytes' in stats
+
+
+def test_lru_eviction_order():
+    manager = ModelManager(budget_bytes=300)
+    for name in 'abcd':
+        manager.register(name, stub_loader(100))
+    manager.preload(['a', 'b', 'c'])
+    manager.get('a')
+    manager.get('d')
+    assert resident(manager) == {'a', 'c', 'd'}
+    manager.get('b')
+    assert resident(manager) == {'a', 'b', 'd'}
+
+
+def test_room_is_made_before_a_known_model_reloads():
+    manager = ModelManager(budget_bytes=200)
+    seen = []
+
+    def load_a():
+        seen.append(manager.used_bytes())
+        return StubModel(100)
+
+    manager.register('a', load_a)
+    manager.register('b', stub_loader(100))
+    manager.register('c', stub_loader(100))
+    manager.preload(['a', 'b', 'c'])
+    assert resident(manager) == {'b', 'c'}
+    manager.get('a')
+    assert seen[-1] + 100 <= 200
+    assert resident(manager) == {'a', 'c'}
+
+
+def test_declared_size_is_used_for_first_load():
+    manager = ModelManager(budget_bytes=150)
+    seen = []
+
+    def load_b():
+        seen.append(manager.used_bytes())
+        return StubModel(100)
+
+    manager.register('a', stub_loader(100))
+    manager.register('b', load_b, size_bytes=100)
+    manager.get('a')
+    manager.get('b')
+    assert seen == [0]
+
+
+def test_pinned_model_survives_over_budget():
+    manager = ModelManager(budget_bytes=150)
+    manager.register('pinned', stub_loader(100), pinned=True)
+    manager.register('a', stub_loader(100))
+    manager.register('b', stub_loader(100))
+    manager.get('pinned')
+    manager.get('a')
+    assert resident(manager) == {'pinned', 'a'}
+    manager.get('b')
+    assert resident(manager) == {'pinned', 'b'}
+    assert manager.stats()['models']['pinned']['evictions'] == 0
+
+
+def test_unpin_enforces_budget():
+    manager = ModelManager(budget_bytes=150)
+    manager.register('a', stub_loader(100), pinned=True)
+    manager.register('b', stub_loader(100))
+    manager.preload()
+    assert resident(manager) == {'a', 'b'}
+    manager.unpin('a')
+    assert resident(manager) == {'b'}
+
+
+def test_pin_unknown_model():
+    manager = ModelManager()
+    assert manager.pin('missing') is False
+
+
+def test_idle_eviction_skips_pinned_and_recently_used():
+    manager = ModelManager(idle_timeout=0.05)
+    manager.register('a', stub_loader(10))
+    manager.register('b', stub_loader(10))
+    manager.register('pinned', stub_loader(10), pinned=True)
+    manager.preload()
+    time.sleep(0.1)
+    manager.get('b')
+    assert manager.evict_idle() == 1
+    assert resident(manager) == {'b', 'pinned'}
+
+
+def test_reload_on_demand_updates_counters():
+    calls = []
+    manager = ModelManager()
+    manager.register('a', stub_loader(16, calls))
+    first = manager.get('a')
+    assert manager.evict('a')
+    assert not manager.is_resident('a')
+    second = manager.get('a')
+    assert second is not first
+    assert len(calls) == 2
+    stats = manager.stats()
+    assert stats['loads'] == 2 and stats['evictions'] == 1
+    assert stats['models']['a']['loads'] == 2
+    assert stats['models']['a']['evictions'] == 1
+    assert stats['models']['a']['size_bytes'] == 16
+
+
+def test_no_budget_never_evicts():
+    manager = ModelManager()
+    for name in 'abcde':
+        manager.register(name, stub_loader(10 ** 6))
+    manager.preload()
+    assert resident(manager) == set('abcde')
+    assert manager.stats()['evictions'] == 0
+
+
+def test_failed_load_is_unavailable():
+    def broken():
+        raise IOError('corrupt model file')
+
+    manager = ModelManager()
+    manager.register('broken', broken)
+    manager.register('missing', stub_loader(10), check=lambda: False)
+    manager.register('lazy', stub_loader(10))
+    assert manager.is_available('broken')
+    assert manager.get('broken') is None
+    assert not manager.is_available('broken')
+    assert not manager.is_available('missing')
+    assert manager.is_available('lazy') and not manager.is_resident('lazy')
+    assert not manager.is_available('unregistered')
+
+
+def test_cold_load_does_not_block_other_models():
+    release = threading.Event()
+    calls = []
+
+    def slow_loader():
+        calls.append(1)
+        release.wait(5)
+        return StubModel(10)
+
+    manager = ModelManager()
+    manager.register('slow', slow_loader)
+    manager.register('fast', stub_loader(10))
+    manager.get('fast')
+
+    loaders = [threading.Thread(target=manager.get, args=('slow',)) for _ in range(2)]
+    for thread in loaders:
+        thread.start()
+    time.sleep(0.05)
+    start = time.monotonic()
+    assert manager.get('fast') is not None
+    manager.stats()
+    assert time.monotonic() - start < 0.5
+    release.set()
+    for thread in loaders:
+        thread.join(5)
+    assert manager.is_resident('slow')
+    assert len(calls) == 1
+
+
+def test_failed_load_is_not_retried_on_every_request():
+    calls = []
+
+    def broken():
+        calls.append(1)
+        raise IOError('corrupt model file')
+
+    manager = ModelManager(retry_after=60)
+    manager.register('broken', broken)
+    for _ in range(5):
+        assert manager.get('broken') is None
+    assert len(calls) == 1
+
+    manager.evict('broken')
+    assert manager.get('broken') is None
+    assert len(calls) == 2
+
+    manager.register('broken', broken)
+    assert manager.get('broken') is None
+    assert len(calls) == 3
+
+
+def test_failed_load_is_retried_after_backoff():
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) == 1:
+            raise IOError('model file still being copied')
+        return StubModel(16)
+
+    manager = ModelManager(retry_after=0.05)
+    manager.register('flaky', flaky)
+    assert manager.get('flaky') is None
+    assert manager.get('flaky') is None
+    time.sleep(0.1)
+    assert manager.get('flaky') is not None
+    assert len(calls) == 2
+    assert manager.is_available('flaky')